@@ -0,0 +1,124 @@
+#include "adk.hpp"
+#include <chrono>
+#include <cstring>
+
+// Driver for demo-py/fuzz.py.
+//
+// Reads a game from stdin:
+//   length width max_round item_count
+//   x y type time param        (item_count lines)
+//   op_count
+//   op op op ...
+//
+// fuzz_driver          prints one state line per op, starting with its status:
+//                      0 rejected, 1 accepted, 2 accepted and the game is over
+// fuzz_driver bench N  replays the ops N times and prints "<ops> <seconds>"
+
+Operation make_your_decision( const Snake& snake_to_operate, const Context& ctx, const OpHistory& op_history )
+{
+	return OP_RIGHT;
+}
+
+void game_over( int gameover_type, int winner, int p0_score, int p1_score ) {}
+
+static void dump_grid( const TwoDimArray<int>& grid, int length, int width )
+{
+	for ( int i = 0; i < length; i++ )
+		for ( int j = 0; j < width; j++ )
+			printf( " %d", grid[i][j] );
+}
+
+static void dump_snakes( const Context& ctx )
+{
+	std::vector<const Snake*> snakes;
+	for ( const auto& s : ctx.snake_list_0() )
+		snakes.push_back( &s );
+	for ( const auto& s : ctx.snake_list_1() )
+		snakes.push_back( &s );
+	std::sort( snakes.begin(), snakes.end(), []( const Snake* a, const Snake* b ) { return a->id < b->id; } );
+	for ( const Snake* s : snakes )
+	{
+		printf( " %d %d %d %d %d", s->id, s->camp, s->length_bank, s->railgun_item.id >= 0 ? 1 : 0,
+				(int) s->length() );
+		for ( const auto& c : s->coord_list )
+			printf( " %d %d", c.x, c.y );
+		printf( " ;" );
+	}
+}
+
+static int op_status( const Context& ctx, bool ok )
+{
+	// do_operation also returns false once the game is over, a rejected op never ends it
+	if ( ok )
+		return 1;
+	if ( ctx.current_round() > ctx.max_round() || ( ctx.snake_list_0().empty() && ctx.snake_list_1().empty() ) )
+		return 2;
+	return 0;
+}
+
+static void dump( const Context& ctx, int status )
+{
+	// nobody is to move once the game is over
+	printf( "%d %d %d|", status, ctx.current_round(), status == 2 ? -1 : ctx.current_player() );
+	dump_grid( ctx.wall_map(), ctx.length(), ctx.width() );
+	printf( "|" );
+	dump_grid( ctx.snake_map(), ctx.length(), ctx.width() );
+	printf( "|" );
+	dump_grid( ctx.item_map(), ctx.length(), ctx.width() );
+	printf( "|" );
+	dump_snakes( ctx );
+	printf( "\n" );
+}
+
+int main( int argc, char** argv )
+{
+	int length, width, max_round, item_count, op_count;
+	if ( scanf( "%d %d %d %d", &length, &width, &max_round, &item_count ) != 4 )
+		return 1;
+	std::vector<Item> items( item_count );
+	for ( int i = 0; i < item_count; i++ )
+	{
+		auto& item = items[i];
+		if ( scanf( "%d %d %d %d %d", &item.x, &item.y, &item.type, &item.time, &item.param ) != 5 )
+			return 1;
+		item.id = i;
+		item.eaten = item.expired = false;
+	}
+	if ( scanf( "%d", &op_count ) != 1 )
+		return 1;
+	std::vector<Operation> ops( op_count );
+	for ( auto& op : ops )
+		if ( scanf( "%d", &op.type ) != 1 )
+			return 1;
+
+	if ( argc == 3 && strcmp( argv[1], "bench" ) == 0 )
+	{
+		int repeat = atoi( argv[2] );
+		long long total = 0;
+		auto start = std::chrono::steady_clock::now();
+		for ( int r = 0; r < repeat; r++ )
+		{
+			std::vector<Item> copy = items;
+			Context ctx( length, width, max_round, std::move( copy ) );
+			for ( const auto& op : ops )
+			{
+				total++;
+				if ( !ctx.do_operation( op ) )
+					break;
+			}
+		}
+		std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+		printf( "%lld %.9f\n", total, elapsed.count() );
+		return 0;
+	}
+
+	Context ctx( length, width, max_round, std::move( items ) );
+	for ( const auto& op : ops )
+	{
+		bool ok = ctx.do_operation( op );
+		dump( ctx, op_status( ctx, ok ) );
+		if ( !ok )
+			break;
+	}
+	return 0;
+}
@@ -0,0 +1,442 @@
+import abc
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+
+from adk import Context, Controller, GameConfig, Item, Map, Snake
+
+# Streaming analytics over recorded games.
+#
+# A game log is one JSON object per line:
+#   {"length": 16, "width": 16, "max_round": 512,
+#    "items": [[x, y, type, time, param], ...],
+#    "operations": [[[turn, snake_id, op], ...], [[turn, snake_id, op], ...]]}
+# where "items" is the item table sent by the judge and "operations" is
+# Context.player_operations at the end of the game.
+#
+# Games are read one at a time and re-simulated through Controller lazily:
+# the replay is a generator and stops as soon as every metric that needs
+# the simulation is satisfied. Metrics only keep running totals, so memory
+# does not grow with the number of games.
+
+dx = [1, 0, -1, 0]
+dy = [0, 1, 0, -1]
+
+DEATH_CAUSES = ['wall', 'out_of_bounds', 'collision', 'self_enclosure', 'enclosed']
+PHASES = ['preprocess', 'init', 'move', 'fire', 'split']
+OP_PHASE = {5: 'fire', 6: 'split'}
+
+
+def record_game(ctx: Context, item_list: List[Item]) -> dict:
+    """
+    :param ctx: context at the end of the game
+    :param item_list: the item table as received at the beginning of the game
+    :return: the log of the game
+    """
+    return {
+        'length': ctx.game_map.length,
+        'width': ctx.game_map.width,
+        'max_round': ctx.max_round,
+        'items': [[item.x, item.y, item.type, item.time, item.param] for item in item_list],
+        'operations': ctx.player_operations,
+    }
+
+
+def read_games(path: str) -> Iterator[dict]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_games(path: str, games: Iterable[dict]) -> None:
+    with open(path, 'w') as f:
+        for game in games:
+            f.write(json.dumps(game, separators=(',', ':')) + '\n')
+
+
+@dataclass
+class TurnEvent:
+    """Emitted once per round, after Controller.round_preprocess."""
+    turn: int
+    lengths: List[int]
+    picked: List[Item]
+
+
+@dataclass
+class OpEvent:
+    """Emitted after each op is applied."""
+    turn: int
+    camp: int
+    snake_id: int
+    op: int
+    ok: bool
+    # (snake id, cause) for every snake that died because of this op
+    deaths: List[Tuple[int, str]] = field(default_factory=list)
+    picked: List[Item] = field(default_factory=list)
+
+
+@dataclass
+class DecisionEvent:
+    """Emitted before each op is applied. The controller is live, do not keep it."""
+    controller: Controller
+    snake: Snake
+    op: int
+
+
+@dataclass
+class PhaseEvent:
+    """Emitted after each timed engine call."""
+    phase: str
+    elapsed: float
+
+
+def camp_lengths(ctx: Context) -> List[int]:
+    lengths = [0, 0]
+    for snake in ctx.snake_list:
+        lengths[snake.camp] += snake.get_len()
+    return lengths
+
+
+def replay(game: dict) -> Iterator[object]:
+    """
+    Re-simulate a game through Controller, op by op.
+
+    :return: an iterator of TurnEvent, DecisionEvent, OpEvent and PhaseEvent
+    """
+    config = GameConfig(length=game['length'], width=game['width'], max_round=game['max_round'])
+    ctx = Context(config=config)
+    items = [Item(x=x, y=y, type=type, time=t, param=param, id=i)
+             for i, (x, y, type, t, param) in enumerate(game['items'])]
+    ctx.game_map = Map(items.copy(), config=config)
+    controller = Controller(ctx)
+    game_map = controller.map
+    queues = [list(reversed(ops)) for ops in game['operations']]
+
+    while ctx.turn <= game['max_round'] and (queues[0] or queues[1]):
+        player = controller.player
+        if player == 0:
+            t0 = time.perf_counter()
+            controller.round_preprocess()
+            elapsed = time.perf_counter() - t0
+            yield TurnEvent(ctx.turn, camp_lengths(ctx), [i for i in items if i.gotten_time == ctx.turn])
+            yield PhaseEvent('preprocess', elapsed)
+        t0 = time.perf_counter()
+        controller.round_init()
+        yield PhaseEvent('init', time.perf_counter() - t0)
+
+        queue = queues[player]
+        while controller.next_snake != -1:
+            if not queue or queue[-1][0] != ctx.turn:
+                return
+            turn, snake_id, op = queue.pop()
+            snake = controller.current_snake_list[controller.next_snake][0]
+            yield DecisionEvent(controller, snake, op)
+            alive = {s.id for s in ctx.snake_list}
+            target, item_id, cause = None, -1, None
+            if 1 <= op <= 4:
+                x, y = target = (snake.coor_list[0][0] + dx[op - 1], snake.coor_list[0][1] + dy[op - 1])
+                if not (0 <= x < game_map.length and 0 <= y < game_map.width):
+                    cause = 'out_of_bounds'
+                else:
+                    item_id = game_map.item_map[x][y]
+                    if game_map.wall_map[x][y] != -1:
+                        cause = 'wall'
+
+            t0 = time.perf_counter()
+            ok = controller.apply(op)
+            yield PhaseEvent(OP_PHASE.get(op, 'move'), time.perf_counter() - t0)
+
+            event = OpEvent(turn, player, snake_id, op, ok)
+            if item_id != -1 and game_map.item_map[target[0]][target[1]] == -1:
+                event.picked.append(items[item_id])
+            for dead in alive - {s.id for s in ctx.snake_list}:
+                if dead != snake.id:
+                    event.deaths.append((dead, 'enclosed'))
+                elif cause is not None:
+                    event.deaths.append((dead, cause))
+                elif game_map.wall_map[target[0]][target[1]] == player:
+                    event.deaths.append((dead, 'self_enclosure'))
+                else:
+                    event.deaths.append((dead, 'collision'))
+            yield event
+            if not ok:
+                return
+        controller.next_player()
+
+
+class Metric(abc.ABC):
+    """
+    Base class of all metrics. A metric sees the raw log of every game through begin,
+    and, if simulate is True, the replay events through feed until it reports done or
+    the replay moves past max_turn.
+    """
+    simulate = True
+
+    def __init__(self, max_turn: Optional[int] = None):
+        self.max_turn = max_turn
+
+    def past(self, turn: int) -> bool:
+        """:return: True if events of this turn are beyond the horizon of the metric"""
+        return self.max_turn is not None and turn > self.max_turn
+
+    def begin(self, game: dict) -> None:
+        pass
+
+    def feed(self, event) -> None:
+        pass
+
+    def done(self) -> bool:
+        return False
+
+    def end(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def merge(self, other: 'Metric') -> None:
+        pass
+
+    @abc.abstractmethod
+    def result(self) -> dict:
+        pass
+
+
+class OpMix(Metric):
+    """Frequency of every op. Read from the log only."""
+    simulate = False
+
+    def __init__(self, max_turn: Optional[int] = None):
+        super().__init__(max_turn)
+        self.count = [0] * 7
+
+    def begin(self, game):
+        for ops in game['operations']:
+            for _, _, op in ops:
+                self.count[op] += 1
+
+    def merge(self, other):
+        self.count = [a + b for a, b in zip(self.count, other.count)]
+
+    def result(self):
+        return {'ops': {str(op): self.count[op] for op in range(1, 7)}}
+
+
+class LengthCurve(Metric):
+    """
+    Mean total length of each camp at the start of every turn, up to max_turn. Without
+    max_turn the curve grows to the longest max_round of the games seen.
+    """
+
+    def __init__(self, max_turn: Optional[int] = None):
+        super().__init__(max_turn)
+        self.total = [[], []]
+        self.games = []
+        self.turn = 0
+        if max_turn is not None:
+            self.grow(max_turn)
+
+    def grow(self, turns: int) -> None:
+        """Make room for turns 1 to turns."""
+        extra = turns + 1 - len(self.games)
+        if extra > 0:
+            self.games += [0] * extra
+            for camp in range(2):
+                self.total[camp] += [0] * extra
+
+    def begin(self, game):
+        self.turn = 0
+        if self.max_turn is None:
+            self.grow(game['max_round'])
+
+    def feed(self, event):
+        if isinstance(event, TurnEvent) and not self.past(event.turn):
+            self.turn = event.turn
+            self.games[event.turn] += 1
+            for camp in range(2):
+                self.total[camp][event.turn] += event.lengths[camp]
+
+    def done(self):
+        return self.max_turn is not None and self.turn >= self.max_turn
+
+    def merge(self, other):
+        self.grow(len(other.games) - 1)
+        for t, n in enumerate(other.games):
+            self.games[t] += n
+        for camp in range(2):
+            for t, n in enumerate(other.total[camp]):
+                self.total[camp][t] += n
+
+    def result(self):
+        return {'length_curve': [[self.total[camp][t] / self.games[t] for t in range(1, len(self.games))
+                                  if self.games[t]] for camp in range(2)]}
+
+
+class Deaths(Metric):
+    """Causes of death and enclosure frequency."""
+
+    def __init__(self, max_turn: Optional[int] = None):
+        super().__init__(max_turn)
+        self.causes = {cause: 0 for cause in DEATH_CAUSES}
+        self.games = 0
+        self.turns = 0
+
+    def begin(self, game):
+        self.games += 1
+
+    def feed(self, event):
+        if isinstance(event, TurnEvent):
+            self.turns += 1
+        elif isinstance(event, OpEvent):
+            for _, cause in event.deaths:
+                self.causes[cause] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.turns += other.turns
+        for cause in DEATH_CAUSES:
+            self.causes[cause] += other.causes[cause]
+
+    def result(self):
+        return {
+            'deaths': self.causes,
+            'enclosures_per_game': self.causes['self_enclosure'] / self.games if self.games else 0.0,
+            'enclosures_per_turn': self.causes['self_enclosure'] / self.turns if self.turns else 0.0,
+        }
+
+
+class ItemPickup(Metric):
+    """Share of the spawned items of each type that were picked up."""
+
+    def __init__(self, max_turn: Optional[int] = None):
+        super().__init__(max_turn)
+        self.spawned = {}
+        self.picked = {}
+        self.items = []
+        self.turn = 0
+
+    def begin(self, game):
+        self.items = game['items']
+        self.turn = 0
+
+    def feed(self, event):
+        if isinstance(event, TurnEvent):
+            self.turn = event.turn
+        if isinstance(event, (TurnEvent, OpEvent)):
+            for item in event.picked:
+                self.picked[item.type] = self.picked.get(item.type, 0) + 1
+
+    def end(self):
+        for _, _, type, t, _ in self.items:
+            if t <= self.turn:
+                self.spawned[type] = self.spawned.get(type, 0) + 1
+        self.items = []
+
+    def merge(self, other):
+        for mine, theirs in ((self.spawned, other.spawned), (self.picked, other.picked)):
+            for type, n in theirs.items():
+                mine[type] = mine.get(type, 0) + n
+
+    def result(self):
+        return {'pickup_rate': {str(type): self.picked.get(type, 0) / n for type, n in self.spawned.items()}}
+
+
+class PhaseTime(Metric):
+    """Total and mean wall time of each engine phase."""
+
+    def __init__(self, max_turn: Optional[int] = None):
+        super().__init__(max_turn)
+        self.total = {phase: 0.0 for phase in PHASES}
+        self.calls = {phase: 0 for phase in PHASES}
+
+    def feed(self, event):
+        if isinstance(event, PhaseEvent):
+            self.total[event.phase] += event.elapsed
+            self.calls[event.phase] += 1
+
+    def merge(self, other):
+        for phase in PHASES:
+            self.total[phase] += other.total[phase]
+            self.calls[phase] += other.calls[phase]
+
+    def result(self):
+        return {'phase_time': {phase: {'total': self.total[phase],
+                                       'mean': self.total[phase] / self.calls[phase] if self.calls[phase] else 0.0}
+                               for phase in PHASES}}
+
+
+DEFAULT_METRICS = [OpMix, LengthCurve, Deaths, ItemPickup, PhaseTime]
+
+
+def analyze(games: Iterable[dict], metrics: Sequence[Metric]) -> Sequence[Metric]:
+    """
+    Feed every game to the metrics. A game is only replayed if some metric needs it,
+    and only until every such metric is done or past its max_turn.
+
+    :return: the metrics
+    """
+    for game in games:
+        for metric in metrics:
+            metric.begin(game)
+        pending = [metric for metric in metrics if metric.simulate]
+        if pending:
+            events = replay(game)
+            for event in events:
+                if isinstance(event, TurnEvent):
+                    pending = [metric for metric in pending if not metric.past(event.turn)]
+                for metric in pending:
+                    metric.feed(event)
+                pending = [metric for metric in pending if not metric.done()]
+                if not pending:
+                    break
+            events.close()
+        for metric in metrics:
+            metric.end()
+    return metrics
+
+
+def analyze_file(path: str, metric_types: Sequence[Type[Metric]] = DEFAULT_METRICS,
+                 max_turn: Optional[int] = None) -> List[Metric]:
+    return list(analyze(read_games(path), [metric_type(max_turn) for metric_type in metric_types]))
+
+
+def analyze_files(paths: Sequence[str], metric_types: Sequence[Type[Metric]] = DEFAULT_METRICS,
+                  processes: Optional[int] = None, max_turn: Optional[int] = None) -> List[Metric]:
+    """
+    Analyze a set of log files, one file per task. With processes > 1 the files are
+    spread over a process pool and the partial metrics are merged afterwards.
+
+    :param max_turn: stop replaying a game after this turn, None for the whole game
+    """
+    total = [metric_type(max_turn) for metric_type in metric_types]
+    if processes is not None and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = pool.map(analyze_file, paths, [metric_types] * len(paths), [max_turn] * len(paths))
+            for part in parts:
+                for metric, other in zip(total, part):
+                    metric.merge(other)
+    else:
+        for path in paths:
+            analyze(read_games(path), total)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate statistics over recorded games.')
+    parser.add_argument('paths', nargs='+', help='game logs, one JSON game per line')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('-t', '--max-turn', type=int, default=None, help='only replay the games up to this turn')
+    args = parser.parse_args()
+
+    res = {}
+    for metric in analyze_files(args.paths, processes=args.processes, max_turn=args.max_turn):
+        res.update(metric.result())
+    json.dump(res, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
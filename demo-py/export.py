@@ -0,0 +1,316 @@
+import argparse
+import glob
+import io
+import os
+import random
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+from numpy.lib.format import dtype_to_descr, open_memmap, write_array_header_1_0
+
+from adk import Context, Controller, GameConfig, Item, Map, Snake
+from analytics import DecisionEvent, OpEvent, read_games, record_game, replay
+
+# Training data export.
+#
+# Every accepted decision of a game becomes one row of five arrays:
+#   planes   uint8   (PLANES, length, width)  board features, see encode
+#   scalars  float32 (SCALARS,)               turn, length bank, held items, ...
+#   ops      uint8   ()                       the op that was chosen, 1 to 6
+#   results  int8    ()                       1 win, -1 loss, 0 tie
+#   margins  float32 ()                       final wall difference
+# The first three are the policy inputs and target, the last two the value
+# targets, known once the replay of the game is over. Both are seen from
+# the camp of the mover: a game is won by having more walls at the end,
+# or lost at once by an illegal op, whose row is dropped. The margin is
+# the final walls of the camp minus those of the opponent.
+#
+# Rows are buffered in chunks and copied into memory-mapped .npy shards of
+# shard_size rows, so the dataset never has to fit in memory. Shards are
+# named planes-00000.npy, scalars-00000.npy, ops-00000.npy, ... and can be
+# opened with np.load(mmap_mode='r') for zero-copy slicing.
+
+PLANES = 9
+# 0 own walls          1 opponent walls      2 body of the snake to move
+# 3 head of the snake  4 other own snakes    5 opponent snakes
+# 6 free cells         7 length items        8 railgun items
+SCALARS = 8
+# 0 turn / max_round   1 camp                2 snake length    3 length bank
+# 4 holds railgun      5 own snake count     6 opponent snake count
+# 7 auto growing
+
+ARRAYS = ['planes', 'scalars', 'ops', 'results', 'margins']
+
+
+def encode(controller: Controller, snake: Snake) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param controller: controller right before snake acts
+    :param snake: the snake to move
+    :return: (planes, scalars) describing the decision point
+    """
+    ctx = controller.ctx
+    game_map = controller.map
+    camp = snake.camp
+    wall_map = np.asarray(game_map.wall_map, dtype=np.int16)
+    snake_map = np.asarray(game_map.snake_map, dtype=np.int16)
+
+    planes = np.zeros((PLANES, game_map.length, game_map.width), dtype=np.uint8)
+    planes[0] = wall_map == camp
+    planes[1] = wall_map == 1 - camp
+    xs, ys = zip(*snake.coor_list)
+    planes[2, xs, ys] = 1
+    planes[3, xs[0], ys[0]] = 1
+    own = [s.id for s in ctx.snake_list if s.camp == camp and s.id != snake.id]
+    opp = [s.id for s in ctx.snake_list if s.camp != camp]
+    planes[4] = np.isin(snake_map, own)
+    planes[5] = np.isin(snake_map, opp)
+    planes[6] = (wall_map == -1) & (snake_map == -1)
+    for item in game_map.item_list:
+        if game_map.item_map[item.x][item.y] == item.id:
+            planes[7 if item.type == 0 else 8, item.x, item.y] = 1
+
+    scalars = np.array([
+        ctx.turn / ctx.max_round,
+        camp,
+        snake.get_len(),
+        snake.length_bank,
+        any(item.type == 2 for item in snake.item_list),
+        len(own) + 1,
+        len(opp),
+        ctx.turn <= ctx.auto_growth_round and snake.camp == snake.id,
+    ], dtype=np.float32)
+    return planes, scalars
+
+
+def wall_margins(ctx: Context) -> List[int]:
+    """:return: for each camp, its walls minus those of the opponent"""
+    walls = [0, 0]
+    for row in ctx.game_map.wall_map:
+        for camp in row:
+            if camp != -1:
+                walls[camp] += 1
+    return [walls[0] - walls[1], walls[1] - walls[0]]
+
+
+def positions(games: Iterable[dict]) -> Iterator[Tuple[np.ndarray, np.ndarray, int, int, int]]:
+    """
+    The rows of a game are held back until its replay is over and the outcome is known.
+    A rejected op gets no row, and its camp loses the game.
+
+    :return: an iterator of (planes, scalars, op, result, margin) over every accepted decision of the games
+    """
+    for game in games:
+        rows = []
+        controller, decision, loser = None, None, None
+        for event in replay(game):
+            if isinstance(event, DecisionEvent):
+                controller = event.controller
+                decision = encode(event.controller, event.snake) + (event.op, event.snake.camp)
+            elif isinstance(event, OpEvent):
+                if event.ok:
+                    rows.append(decision)
+                else:
+                    loser = event.camp
+        if controller is None:
+            continue
+        margins = wall_margins(controller.ctx)
+        for planes, scalars, op, camp in rows:
+            if loser is None:
+                result = (margins[camp] > 0) - (margins[camp] < 0)
+            else:
+                result = -1 if camp == loser else 1
+            yield planes, scalars, op, result, margins[camp]
+
+
+def _shrink(path: str, rows: int) -> None:
+    """Cut a .npy file down to its first rows rows, rewriting the header in place."""
+    array = np.load(path, mmap_mode='r')
+    shape, dtype, offset = array.shape, array.dtype, array.offset
+    del array
+    header = {'descr': dtype_to_descr(dtype), 'fortran_order': False, 'shape': (rows,) + shape[1:]}
+    buf = io.BytesIO()
+    write_array_header_1_0(buf, header)
+    size = offset + rows * dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+    if buf.tell() == offset:
+        with open(path, 'r+b') as f:
+            f.write(buf.getvalue())
+            f.truncate(size)
+    else:
+        data = np.load(path, mmap_mode='r')[:rows]
+        out = open_memmap(path + '.tmp', mode='w+', dtype=dtype, shape=data.shape)
+        out[:] = data
+        out.flush()
+        del out, data
+        os.replace(path + '.tmp', path)
+
+
+class ShardWriter:
+    """
+    Append rows to memory-mapped .npy shards.
+
+    Rows are first gathered in a chunk buffer of chunk_size rows, each full chunk is copied
+    into the shards with one slice assignment per shard. The last shard is shrunk to the number
+    of rows actually written on close.
+    """
+
+    def __init__(self, out_dir: str, length: int = 16, width: int = 16,
+                 shard_size: int = 1 << 16, chunk_size: int = 1024):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.chunk_size = chunk_size
+        self.specs = {
+            'planes': ((PLANES, length, width), np.uint8),
+            'scalars': ((SCALARS,), np.float32),
+            'ops': ((), np.uint8),
+            'results': ((), np.int8),
+            'margins': ((), np.float32),
+        }
+        self.chunk = {name: np.zeros((chunk_size,) + shape, dtype=dtype) for name, (shape, dtype) in self.specs.items()}
+        self.in_chunk = 0
+        self.shard = None
+        self.shard_idx = 0
+        self.in_shard = 0
+        self.rows = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def path(self, name: str, idx: int) -> str:
+        return os.path.join(self.out_dir, '%s-%05d.npy' % (name, idx))
+
+    def append(self, planes: np.ndarray, scalars: np.ndarray, op: int, result: int, margin: int) -> None:
+        for name, value in zip(ARRAYS, (planes, scalars, op, result, margin)):
+            self.chunk[name][self.in_chunk] = value
+        self.in_chunk += 1
+        self.rows += 1
+        if self.in_chunk == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        done = 0
+        while done < self.in_chunk:
+            if self.shard is None:
+                self.shard = {name: open_memmap(self.path(name, self.shard_idx), mode='w+', dtype=dtype,
+                                                shape=(self.shard_size,) + shape)
+                              for name, (shape, dtype) in self.specs.items()}
+            n = min(self.in_chunk - done, self.shard_size - self.in_shard)
+            for name in ARRAYS:
+                self.shard[name][self.in_shard:self.in_shard + n] = self.chunk[name][done:done + n]
+            self.in_shard += n
+            done += n
+            if self.in_shard == self.shard_size:
+                self.close_shard()
+        self.in_chunk = 0
+
+    def close_shard(self) -> None:
+        if self.shard is None:
+            return
+        for name in ARRAYS:
+            self.shard[name].flush()
+        self.shard = None
+        if self.in_shard < self.shard_size:
+            for name in ARRAYS:
+                _shrink(self.path(name, self.shard_idx), self.in_shard)
+        self.shard_idx += 1
+        self.in_shard = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.close_shard()
+
+
+def export(games: Iterable[dict], out_dir: str, **kwargs) -> int:
+    """
+    Write every decision point of the games to shards in out_dir. The board size of
+    the shards is taken from the first game, all the others must have the same.
+
+    :return: the number of rows written
+    """
+    games = iter(games)
+    first = next(games, None)
+    if first is None:
+        return 0
+    length, width = first['length'], first['width']
+
+    def checked():
+        yield first
+        for idx, game in enumerate(games, 1):
+            if (game['length'], game['width']) != (length, width):
+                raise ValueError('game %d is %dx%d but the shards are %dx%d'
+                                 % (idx, game['length'], game['width'], length, width))
+            yield game
+
+    with ShardWriter(out_dir, length=length, width=width, **kwargs) as writer:
+        for row in positions(checked()):
+            writer.append(*row)
+    return writer.rows
+
+
+def open_shards(out_dir: str) -> List[Tuple[np.ndarray, ...]]:
+    """
+    :return: (planes, scalars, ops, results, margins) read-only memory maps for every shard in out_dir
+    """
+    ret = []
+    for path in sorted(glob.glob(os.path.join(out_dir, 'ops-*.npy'))):
+        idx = os.path.basename(path)[len('ops-'):-len('.npy')]
+        ret.append(tuple(np.load(os.path.join(out_dir, '%s-%s.npy' % (name, idx)), mmap_mode='r')
+                         for name in ARRAYS))
+    return ret
+
+
+def random_items(rnd: random.Random, length: int, width: int, max_round: int, count: int) -> List[Item]:
+    return [Item(x=rnd.randrange(length), y=rnd.randrange(width), type=rnd.choice([0, 0, 0, 2]),
+                 time=rnd.randrange(1, max_round + 1), param=rnd.randrange(1, 10), id=i) for i in range(count)]
+
+
+def self_play(item_list: List[Item], length: int = 16, width: int = 16, max_round: int = 512) -> dict:
+    """
+    Play sampleAI against itself on the given item table.
+
+    :return: the log of the game, as analytics.record_game
+    """
+    import sampleAI
+
+    config = GameConfig(length=length, width=width, max_round=max_round)
+    ctx = Context(config=config)
+    ctx.game_map = Map([Item(x=i.x, y=i.y, type=i.type, time=i.time, param=i.param, id=i.id) for i in item_list],
+                       config=config)
+    controller = Controller(ctx)
+    ais = [sampleAI.AI(), sampleAI.AI()]
+    while ctx.turn <= max_round and ctx.snake_list:
+        if controller.player == 0:
+            controller.round_preprocess()
+        controller.round_init()
+        while controller.next_snake != -1:
+            snake = controller.current_snake_list[controller.next_snake][0]
+            if not controller.apply(ais[controller.player].judge(snake, ctx)):
+                return record_game(ctx, item_list)
+        controller.next_player()
+    return record_game(ctx, item_list)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export decision points as memory-mapped training data.')
+    parser.add_argument('out_dir')
+    parser.add_argument('paths', nargs='*', help='game logs, one JSON game per line')
+    parser.add_argument('--self-play', type=int, default=0, help='number of extra sampleAI games to play')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shard-size', type=int, default=1 << 16)
+    args = parser.parse_args()
+
+    def games():
+        for path in args.paths:
+            yield from read_games(path)
+        rnd = random.Random(args.seed)
+        for _ in range(args.self_play):
+            yield self_play(random_items(rnd, 16, 16, 512, 256))
+
+    print(export(games(), args.out_dir, shard_size=args.shard_size))
+
+
+if __name__ == '__main__':
+    main()
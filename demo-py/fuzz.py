@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from adk import Context, Controller, GameConfig, Item, Map
+from joint import dx, dy, is_legal, is_suicide
+
+# Differential fuzzing between the Python engine (adk.Controller) and the
+# C++ engine (adk.hpp Context).
+#
+# Random op sequences are generated by playing the Python engine, biased
+# towards splits, railgun fire and self-enclosure. Both engines replay the
+# sequence and print their status and full state after every op in the
+# same text format (see demo-cpp/fuzz_driver.cpp), the first differing line
+# is a divergence. A rejected op ends the game with ILLEGAL_ACTION, so once
+# either engine rejects an op only the verdict is compared, not the state
+# it leaves behind. An op that ends the game normally is compared in full.
+# Diverging cases are shrunk by removing ops and items for as long as the
+# engines still disagree in the same sections.
+#
+# Items are put on distinct cells unless overlap is asked for, two items
+# on one cell make both engines disagree on the item map and hide every
+# other difference.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVER_SOURCE = os.path.join(ROOT, 'demo-cpp', 'fuzz_driver.cpp')
+DRIVER = os.path.join(ROOT, 'demo-cpp', 'fuzz_driver')
+SECTIONS = ['status', 'wall_map', 'snake_map', 'item_map', 'snakes']
+# status of an op, the first field of every state line
+REJECTED, OK, GAME_OVER = 0, 1, 2
+
+
+@dataclass
+class Case:
+    length: int = 16
+    width: int = 16
+    max_round: int = 64
+    # (x, y, type, time, param), the id of an item is its index
+    items: List[Tuple[int, int, int, int, int]] = field(default_factory=list)
+    ops: List[int] = field(default_factory=list)
+
+    def to_text(self) -> str:
+        lines = ['%d %d %d %d' % (self.length, self.width, self.max_round, len(self.items))]
+        lines += ['%d %d %d %d %d' % item for item in self.items]
+        lines += [str(len(self.ops)), ' '.join(map(str, self.ops))]
+        return '\n'.join(lines) + '\n'
+
+
+def build_driver(cxx: str = 'g++') -> str:
+    """
+    Compile demo-cpp/fuzz_driver.cpp unless the binary is newer than its sources.
+
+    :return: path of the driver binary
+    """
+    sources = [DRIVER_SOURCE, os.path.join(ROOT, 'demo-cpp', 'adk.hpp')]
+    if not os.path.exists(DRIVER) or os.path.getmtime(DRIVER) < max(map(os.path.getmtime, sources)):
+        subprocess.run([cxx, DRIVER_SOURCE, '-o', DRIVER, '-O2', '-I', os.path.dirname(DRIVER_SOURCE), '-std=c++11'],
+                       check=True)
+    return DRIVER
+
+
+class PyEngine:
+    """Drive a Controller the way the judge does, one op at a time."""
+
+    def __init__(self, case: Case):
+        config = GameConfig(length=case.length, width=case.width, max_round=case.max_round)
+        self.ctx = Context(config=config)
+        self.ctx.game_map = Map([Item(x=x, y=y, type=type, time=t, param=param, id=i)
+                                 for i, (x, y, type, t, param) in enumerate(case.items)], config=config)
+        self.controller = Controller(self.ctx)
+        self.controller.round_preprocess()
+        self.controller.round_init()
+
+    def step(self, op: int) -> int:
+        """
+        :return: REJECTED, OK, or GAME_OVER if op was accepted and ended the game
+        """
+        ctx, controller = self.ctx, self.controller
+        if not controller.apply(op):
+            return REJECTED
+        if not ctx.snake_list:
+            return GAME_OVER
+        while controller.next_snake == -1:
+            controller.next_player()
+            if controller.player == 0:
+                if ctx.turn > ctx.max_round:
+                    return GAME_OVER
+                controller.round_preprocess()
+            controller.round_init()
+        return OK
+
+    def current_snake(self):
+        return self.controller.current_snake_list[self.controller.next_snake][0]
+
+    def dump(self, status: int) -> str:
+        game_map = self.ctx.game_map
+        # nobody is to move once the game is over
+        player = -1 if status == GAME_OVER else self.ctx.current_player
+        parts = ['%d %d %d' % (status, self.ctx.turn, player)]
+        for grid in (game_map.wall_map, game_map.snake_map, game_map.item_map):
+            parts.append(''.join(' %d' % grid[i][j] for i in range(game_map.length) for j in range(game_map.width)))
+        snakes = []
+        for snake in sorted(self.ctx.snake_list, key=lambda s: s.id):
+            railgun = any(item.type == 2 for item in snake.item_list)
+            coor = ''.join(' %d %d' % c for c in snake.coor_list)
+            snakes.append(' %d %d %d %d %d%s ;' % (snake.id, snake.camp, snake.length_bank, railgun,
+                                                  snake.get_len(), coor))
+        parts.append(''.join(snakes))
+        return '|'.join(parts)
+
+
+def run_py(case: Case) -> List[str]:
+    engine = PyEngine(case)
+    ret = []
+    for op in case.ops:
+        status = engine.step(op)
+        ret.append(engine.dump(status))
+        if status != OK:
+            break
+    return ret
+
+
+def run_cpp(case: Case, driver: str) -> List[str]:
+    out = subprocess.run([driver], input=case.to_text(), capture_output=True, text=True, check=True)
+    return out.stdout.splitlines()
+
+
+def compare(py: List[str], cpp: List[str]) -> Optional[Tuple[int, Tuple[str, ...]]]:
+    """
+    :param py: output of run_py
+    :param cpp: output of run_cpp
+    :return: (index of the first op after which the engines disagree, names of the differing
+             sections), None if they agree
+    """
+    rejected = str(REJECTED)
+    for idx, (a, b) in enumerate(zip(py, cpp)):
+        a_status, b_status = a.split(' ', 1)[0], b.split(' ', 1)[0]
+        if a_status == rejected or b_status == rejected:
+            # the game is lost, whatever state the rejected op left behind does not matter
+            return None if a_status == b_status else (idx, ('status',))
+        if a != b:
+            return idx, tuple(name for name, x, y in zip(SECTIONS, a.split('|'), b.split('|')) if x != y)
+    if len(py) != len(cpp):
+        return min(len(py), len(cpp)), ('length',)
+    return None
+
+
+def signature(case: Case, driver: str) -> Optional[Tuple[str, ...]]:
+    """:return: the sections that differ at the first divergence, None if the engines agree"""
+    res = compare(run_py(case), run_cpp(case, driver))
+    return None if res is None else res[1]
+
+
+def first_divergence(case: Case, driver: str) -> Optional[int]:
+    """
+    :return: index of the first op after which the engines disagree, None if they agree
+    """
+    res = compare(run_py(case), run_cpp(case, driver))
+    return None if res is None else res[0]
+
+
+def describe(case: Case, driver: str) -> List[str]:
+    """
+    :return: the sections that differ at the first divergence, with both values
+    """
+    py, cpp = run_py(case), run_cpp(case, driver)
+    res = compare(py, cpp)
+    if res is None:
+        return []
+    idx, names = res
+    if names == ('length',):
+        return ['one engine stopped early: python %d ops, c++ %d ops' % (len(py), len(cpp))]
+    return ['%s\n  python: %s\n  c++:    %s' % (name, a.strip(), b.strip())
+            for name, a, b in zip(SECTIONS, py[idx].split('|'), cpp[idx].split('|')) if name in names]
+
+
+def generate(rnd: random.Random, length: int = 16, width: int = 16, max_round: int = 64,
+             item_count: int = 48, max_ops: int = 400, overlap: bool = False) -> Case:
+    """
+    Generate a random case by playing the Python engine. Ops are always legal for the
+    snake to move, but may be suicidal.
+
+    :param overlap: let several items share a cell, otherwise every item has its own
+    """
+    if overlap:
+        cells = [(rnd.randrange(length), rnd.randrange(width)) for _ in range(item_count)]
+    else:
+        cells = [divmod(cell, width) for cell in rnd.sample(range(length * width), item_count)]
+    items = [(x, y, rnd.choice([0, 0, 2]), rnd.randrange(1, max_round + 1), rnd.randrange(1, 10))
+             for x, y in cells]
+    case = Case(length, width, max_round, items, [])
+    engine = PyEngine(case)
+    for _ in range(max_ops):
+        controller, snake = engine.controller, engine.current_snake()
+        legal = [op for op in range(1, 7) if is_legal(controller, snake, op)]
+        enclose = [op for op in legal if op <= 4 and (snake.coor_list[0][0] + dx[op - 1],
+                                                        snake.coor_list[0][1] + dy[op - 1]) in snake.coor_list[2:]]
+        safe = [op for op in legal if op <= 4 and not is_suicide(controller, snake, op)]
+        r = rnd.random()
+        if enclose and r < 0.5:
+            op = rnd.choice(enclose)
+        elif 5 in legal and r < 0.6:
+            op = 5
+        elif 6 in legal and r < 0.15:
+            op = 6
+        elif safe and r < 0.97:
+            op = rnd.choice(safe)
+        else:
+            op = rnd.choice(legal)
+        case.ops.append(op)
+        if engine.step(op) != OK:
+            break
+    return case
+
+
+def _reduce(seq: list, test: Callable[[list], bool]) -> list:
+    """Delta debugging: drop chunks of seq while test still holds, halving the chunk size."""
+    chunk = max(1, len(seq) // 2)
+    while seq:
+        removed = False
+        start = 0
+        while start < len(seq):
+            cand = seq[:start] + seq[start + chunk:]
+            if test(cand):
+                seq = cand
+                removed = True
+            else:
+                start += chunk
+        if chunk == 1 and not removed:
+            break
+        chunk = max(1, chunk // 2)
+    return seq
+
+
+def shrink(case: Case, driver: str) -> Case:
+    """
+    :return: a smaller case on which the engines still disagree in the same sections
+    """
+    idx, names = compare(run_py(case), run_cpp(case, driver))
+    case = replace(case, ops=case.ops[:idx + 1])
+    ops = _reduce(case.ops, lambda ops: signature(replace(case, ops=ops), driver) == names)
+    case = replace(case, ops=ops)
+    items = _reduce(case.items, lambda items: signature(replace(case, items=items), driver) == names)
+    return replace(case, items=items)
+
+
+def bench_py(case: Case, repeat: int) -> Tuple[int, float]:
+    total = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        engine = PyEngine(case)
+        for op in case.ops:
+            total += 1
+            if engine.step(op) != OK:
+                break
+    return total, time.perf_counter() - start
+
+
+def bench_cpp(case: Case, driver: str, repeat: int) -> Tuple[int, float]:
+    out = subprocess.run([driver, 'bench', str(repeat)], input=case.to_text(), capture_output=True, text=True,
+                         check=True)
+    total, elapsed = out.stdout.split()
+    return int(total), float(elapsed)
+
+
+def fuzz(cases: int, seed: int, driver: str, **kwargs) -> Dict[Tuple[str, ...], List[Case]]:
+    """
+    :return: the shrunk diverging cases, grouped by the sections that differ, smallest first
+    """
+    ret = {}
+    for idx in range(cases):
+        case = generate(random.Random(seed + idx), **kwargs)
+        names = signature(case, driver)
+        if names is None:
+            continue
+        ret.setdefault(names, []).append(shrink(case, driver))
+    for found in ret.values():
+        found.sort(key=lambda case: len(case.ops) + len(case.items))
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Differential fuzzing of the Python and C++ engines.')
+    parser.add_argument('--cases', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-round', type=int, default=64)
+    parser.add_argument('--max-ops', type=int, default=400)
+    parser.add_argument('--overlap', action='store_true', help='let several items share a cell')
+    parser.add_argument('--bench', type=int, default=20, help='replays per engine for the throughput report')
+    parser.add_argument('--cxx', default='g++')
+    args = parser.parse_args()
+
+    driver = build_driver(args.cxx)
+    found = fuzz(args.cases, args.seed, driver, max_round=args.max_round, max_ops=args.max_ops,
+                 overlap=args.overlap)
+    for names, cases in sorted(found.items(), key=lambda kv: -len(kv[1])):
+        case = cases[0]
+        print('%d cases diverge in %s, smallest after op %d of %s'
+              % (len(cases), ' '.join(names), first_divergence(case, driver), json.dumps(case.__dict__)))
+        for line in describe(case, driver):
+            print(line)
+    print('%d / %d cases diverged' % (sum(map(len, found.values())), args.cases))
+
+    if args.bench:
+        case = generate(random.Random(args.seed), max_round=args.max_round, max_ops=args.max_ops, overlap=args.overlap)
+        for name, (total, elapsed) in (('python', bench_py(case, args.bench)),
+                                       ('c++', bench_cpp(case, driver, args.bench))):
+            print('%-6s %10d ops %10.4f s %14.0f moves/s' % (name, total, elapsed, total / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import copy
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+from adk import Context, Controller, Map, Snake
+
+# Joint action enumeration for all the snakes a camp moves in one turn.
+#
+# The snakes of a camp act one after another (Controller.find_next_snake),
+# so a joint action is a sequence of ops. The sequences are enumerated as a
+# depth first tree: the state after a common prefix is computed once and
+# shared by all its children, and illegal or suicidal ops are dropped before
+# any state is copied.
+
+dx = [1, 0, -1, 0]
+dy = [0, 1, 0, -1]
+
+JointAction = Tuple[int, ...]
+
+
+class _Fresh:
+    """Copies into new objects. runtime.NodePool has the same interface with recycled ones."""
+    copy = staticmethod(copy.copy)
+
+    @staticmethod
+    def copy_list(src: list) -> list:
+        return src.copy()
+
+    @staticmethod
+    def copy_grid(src: List[List[int]]) -> List[List[int]]:
+        return [row.copy() for row in src]
+
+
+FRESH = _Fresh()
+
+
+def clone_map(game_map: Map, pool=FRESH) -> Map:
+    ret = pool.copy(game_map)
+    ret.item_list = pool.copy_list(game_map.item_list)
+    for idx, item in enumerate(ret.item_list):
+        ret.item_list[idx] = pool.copy(item)
+    ret.wall_map = pool.copy_grid(game_map.wall_map)
+    ret.snake_map = pool.copy_grid(game_map.snake_map)
+    ret.item_map = pool.copy_grid(game_map.item_map)
+    return ret
+
+
+def clone_snake(snake: Snake, pool=FRESH) -> Snake:
+    # items held by a snake are never mutated again, they can be shared
+    ret = pool.copy(snake)
+    ret.coor_list = pool.copy_list(snake.coor_list)
+    ret.item_list = pool.copy_list(snake.item_list)
+    return ret
+
+
+def clone(controller: Controller, pool=FRESH) -> Controller:
+    """
+    :param pool: where to take the copies from, e.g. a runtime.NodePool
+    :return: an independent copy of the controller and the context it drives
+    """
+    ctx = pool.copy(controller.ctx)
+    ctx.game_map = clone_map(controller.ctx.game_map, pool)
+    ctx.snake_list = pool.copy_list(controller.ctx.snake_list)
+    for idx, snake in enumerate(ctx.snake_list):
+        ctx.snake_list[idx] = clone_snake(snake, pool)
+    ctx.player_operations = pool.copy_list(controller.ctx.player_operations)
+    for idx, ops in enumerate(ctx.player_operations):
+        ctx.player_operations[idx] = pool.copy_list(ops)
+
+    ret = pool.copy(controller)
+    ret.ctx = ctx
+    ret.map = ctx.game_map
+    by_id = {snake.id: snake for snake in ctx.snake_list}
+    ret.current_snake_list = pool.copy_list(controller.current_snake_list)
+    for idx, (snake, dead) in enumerate(ret.current_snake_list):
+        ret.current_snake_list[idx] = (by_id[snake.id] if snake.id in by_id else clone_snake(snake, pool), dead)
+    return ret
+
+
+def is_legal(controller: Controller, snake: Snake, op: int) -> bool:
+    """
+    :return: True if Controller.apply would accept op for snake
+    """
+    if 1 <= op <= 4:
+        coor = snake.coor_list
+        if len(coor) == 1:
+            return True
+        auto_grow = controller.ctx.turn <= controller.ctx.auto_growth_round and snake.camp == snake.id
+        x, y = coor[0][0] + dx[op - 1], coor[0][1] + dy[op - 1]
+        return not ((len(coor) > 2 or auto_grow or snake.length_bank) and (x, y) == coor[1])
+    elif op == 5:
+        return len(snake.item_list) > 0 and snake.item_list[0].type == 2 and len(snake.coor_list) > 1
+    elif op == 6:
+        return controller.ctx.get_snake_count(snake.camp) < 4 and len(snake.coor_list) > 1
+    return False
+
+
+def is_suicide(controller: Controller, snake: Snake, op: int) -> bool:
+    """
+    :return: True if op kills snake without claiming anything, i.e. running into a wall,
+             out of bounds or into another snake. Enclosing with its own body is not suicide.
+    """
+    if op > 4:
+        return False
+    game_map = controller.map
+    x, y = snake.coor_list[0][0] + dx[op - 1], snake.coor_list[0][1] + dy[op - 1]
+    if x < 0 or x >= game_map.length or y < 0 or y >= game_map.width or game_map.wall_map[x][y] != -1:
+        return True
+    return game_map.snake_map[x][y] not in (-1, snake.id)
+
+
+def candidate_ops(controller: Controller, ops: Sequence[int] = range(1, 7)) -> List[int]:
+    """
+    :return: the ops of the current snake that are legal and not suicidal. If every legal op
+             is suicidal they are all returned, the snake has to do something.
+    """
+    snake = controller.current_snake_list[controller.next_snake][0]
+    legal = [op for op in ops if is_legal(controller, snake, op)]
+    safe = [op for op in legal if not is_suicide(controller, snake, op)]
+    return safe if safe else legal
+
+
+def joint_moves(controller: Controller, ops: Sequence[int] = range(1, 7), pool=None) \
+        -> Iterator[Tuple[JointAction, Controller]]:
+    """
+    Enumerate every joint action of the camp to move.
+    Call it after Controller.round_init. The given controller is left untouched.
+
+    :param ops: the ops to consider for every snake, a snake that can do none of them
+                falls back to all the ops
+    :param pool: a runtime.NodePool to recycle the states. The controller yielded is then
+                 only valid until the next iteration.
+    :return: an iterator of (joint action, controller after the whole joint action)
+    """
+    def expand(node: Controller, prefix: JointAction):
+        if node.next_snake == -1:
+            yield prefix, node
+            if pool is not None:
+                pool.release(node)
+            return
+        # a restricted ops may leave the snake nothing to do, it still has to act
+        cand = candidate_ops(node, ops) or candidate_ops(node)
+        for idx, op in enumerate(cand):
+            # the last child may take over the state of its parent
+            child = node if idx == len(cand) - 1 else clone(node, pool or FRESH)
+            child.apply(op)
+            yield from expand(child, prefix + (op,))
+
+    if controller.next_snake == -1:
+        return
+    yield from expand(clone(controller, pool or FRESH), ())
+
+
+def best_joint_move(controller: Controller, key: Callable[[Context], float], pool=None) -> Optional[JointAction]:
+    """
+    :param key: scores the context after a joint action, higher is better
+    :param pool: passed to joint_moves
+    :return: the joint action with the highest score, None if the camp has no snake to move
+    """
+    best, best_score = None, None
+    for action, state in joint_moves(controller, pool=pool):
+        score = key(state.ctx)
+        if best_score is None or score > best_score:
+            best, best_score = action, score
+    return best
+
+
+def apply_joint(controller: Controller, action: JointAction) -> bool:
+    """
+    Apply a whole joint action to the controller.
+
+    :return: False if some op was rejected, the remaining ops are not applied
+    """
+    for op in action:
+        if controller.next_snake == -1 or not controller.apply(op):
+            return False
+    return True
@@ -0,0 +1,287 @@
+import argparse
+import copy
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from adk import Context, Controller, GameConfig, Item, Map
+
+# Allocation-aware runtime for long search sessions.
+#
+# NodePool keeps free lists of the objects a search throws away at every
+# node: the Controller/Context/Map/Snake shells, the board grids and the
+# coordinate and item lists. joint.clone takes one to copy into recycled
+# buffers instead of fresh ones.
+#
+# Runtime moves everything that lives for the whole game into the permanent
+# GC generation, keeps the cyclic collector off while a decision is being
+# made and runs it in the time the opponent is thinking instead. It also
+# records per decision latency, GC pauses, the objects the pool had to
+# allocate and, with tracemalloc, the peak memory of the decision. With
+# control off it only records, which gives the baseline to compare with:
+#
+#   python runtime.py --turns 300
+
+
+class NodePool:
+    """Free lists for search nodes. A released object must not be used by the caller anymore."""
+
+    def __init__(self):
+        self.objects: Dict[type, List[object]] = {}
+        self.grids: List[List[List[int]]] = []
+        self.lists: List[list] = []
+        self.acquired = 0
+        self.reused = 0
+
+    def copy(self, obj):
+        """:return: a shallow copy of obj, in a recycled object if possible"""
+        self.acquired += 1
+        free = self.objects.get(type(obj))
+        if free:
+            self.reused += 1
+            ret = free.pop()
+            ret.__dict__.update(obj.__dict__)
+            return ret
+        return copy.copy(obj)
+
+    def copy_list(self, src: list) -> list:
+        self.acquired += 1
+        if self.lists:
+            self.reused += 1
+            ret = self.lists.pop()
+            ret[:] = src
+            return ret
+        return src.copy()
+
+    def copy_grid(self, src: List[List[int]]) -> List[List[int]]:
+        self.acquired += 1
+        if self.grids and len(self.grids[-1]) == len(src):
+            self.reused += 1
+            ret = self.grids.pop()
+            for dst, row in zip(ret, src):
+                dst[:] = row
+            return ret
+        return [row.copy() for row in src]
+
+    def release(self, controller: Controller) -> None:
+        """Give back every buffer of a controller made by joint.clone with this pool."""
+        ctx = controller.ctx
+        game_map = ctx.game_map
+        self.grids += [game_map.wall_map, game_map.snake_map, game_map.item_map]
+        self.objects.setdefault(Item, []).extend(game_map.item_list)
+        self.lists.append(game_map.item_list)
+        snakes = {id(snake): snake for snake in ctx.snake_list}
+        snakes.update((id(snake), snake) for snake, _ in controller.current_snake_list)
+        for snake in snakes.values():
+            self.lists += [snake.coor_list, snake.item_list]
+        self.lists += [ctx.snake_list, controller.current_snake_list]
+        self.lists += ctx.player_operations
+        self.lists.append(ctx.player_operations)
+        for obj in [controller, ctx, game_map, *snakes.values()]:
+            self.objects.setdefault(type(obj), []).append(obj)
+
+    def stats(self) -> Dict[str, int]:
+        return {'acquired': self.acquired, 'reused': self.reused, 'allocated': self.acquired - self.reused}
+
+
+@dataclass
+class DecisionStats:
+    elapsed: float
+    gc_pause: float
+    moves: int
+    # requests to the NodePool and how many of them needed a new object
+    pool_requests: int
+    pool_allocations: int
+    # memory blocks / GC tracked objects still alive at the end of the decision minus those
+    # at the start. This is what the decision retains, not what it allocated.
+    retained_blocks: int
+    retained_gc_objects: int
+    # highest traced memory above the start of the decision, 0 unless trace is on
+    peak_bytes: int
+
+
+@dataclass
+class Runtime:
+    """
+    Usage, around the loop of sampleAI.run:
+
+        rt = Runtime(pool=NodePool())
+        rt.start()                   # once the map is loaded
+        with rt.decision():
+            op = ai.judge(snake, ctx)
+        rt.idle()                    # while waiting for the opponent
+        rt.stop()                    # restore the GC settings
+    """
+    # the pool used by the search, sampled around every decision
+    pool: Optional[NodePool] = None
+    # trace memory with tracemalloc to get the peak of every decision, slows everything down
+    trace: bool = False
+    # gen0 threshold while GC is enabled, high enough that it rarely triggers by itself
+    threshold: Tuple[int, int, int] = (50000, 20, 100)
+    # collect every generation up to this one in idle
+    idle_generation: int = 1
+    # False to leave the GC settings alone and only record the decisions
+    control: bool = True
+    history: List[DecisionStats] = field(default_factory=list)
+    gc_pause: float = 0.0
+    _gc_start: float = 0.0
+    _saved_threshold: Optional[Tuple[int, int, int]] = None
+    _saved_enabled: bool = True
+    _froze: bool = False
+
+    def _gc_callback(self, phase, info):
+        if phase == 'start':
+            self._gc_start = time.perf_counter()
+        else:
+            self.gc_pause += time.perf_counter() - self._gc_start
+
+    def start(self) -> None:
+        """
+        Freeze the objects alive so far, they will never be scanned again. If the caller
+        has frozen objects already nothing more is frozen, gc.unfreeze could not tell
+        them apart in stop.
+        """
+        self._saved_threshold = gc.get_threshold()
+        self._saved_enabled = gc.isenabled()
+        if self.control:
+            self._froze = gc.get_freeze_count() == 0
+            if self._froze:
+                gc.collect()
+                gc.freeze()
+            gc.set_threshold(*self.threshold)
+        if self._gc_callback not in gc.callbacks:
+            gc.callbacks.append(self._gc_callback)
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        """Restore the GC settings found by start."""
+        if self._gc_callback in gc.callbacks:
+            gc.callbacks.remove(self._gc_callback)
+        if self._froze:
+            gc.unfreeze()
+            self._froze = False
+        if self._saved_threshold is not None:
+            gc.set_threshold(*self._saved_threshold)
+            if self._saved_enabled:
+                gc.enable()
+            else:
+                gc.disable()
+            self._saved_threshold = None
+        if self.trace and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def decision(self, moves: int = 1):
+        """Run a decision with the cyclic GC disabled and record its cost."""
+        enabled = gc.isenabled()
+        if self.control:
+            gc.disable()
+        pause = self.gc_pause
+        acquired, reused = (self.pool.acquired, self.pool.reused) if self.pool else (0, 0)
+        blocks = sys.getallocatedblocks()
+        objects = gc.get_count()[0]
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1] - base if tracing else 0
+            requests = self.pool.acquired - acquired if self.pool else 0
+            allocations = requests - (self.pool.reused - reused) if self.pool else 0
+            self.history.append(DecisionStats(elapsed, self.gc_pause - pause, moves, requests, allocations,
+                                              sys.getallocatedblocks() - blocks, gc.get_count()[0] - objects,
+                                              peak))
+            if enabled:
+                gc.enable()
+
+    def idle(self) -> None:
+        """Collect the garbage of the last decision outside of the time limit."""
+        if self.control:
+            gc.collect(self.idle_generation)
+
+    def report(self) -> Dict[str, float]:
+        """:return: latency percentiles, GC pauses and per move costs over all decisions"""
+        if not self.history:
+            return {}
+        elapsed = sorted(s.elapsed for s in self.history)
+        moves = sum(s.moves for s in self.history) or 1
+        return {
+            'decisions': len(elapsed),
+            'p50': elapsed[len(elapsed) // 2],
+            'p99': elapsed[min(len(elapsed) - 1, len(elapsed) * 99 // 100)],
+            'max': elapsed[-1],
+            'gc_pause': sum(s.gc_pause for s in self.history),
+            'pool_requests_per_move': sum(s.pool_requests for s in self.history) / moves,
+            'pool_allocations_per_move': sum(s.pool_allocations for s in self.history) / moves,
+            'retained_blocks_per_move': sum(s.retained_blocks for s in self.history) / moves,
+            'retained_gc_objects_per_move': sum(s.retained_gc_objects for s in self.history) / moves,
+            'peak_bytes': max(s.peak_bytes for s in self.history),
+        }
+
+
+def bench(runtime: Runtime, turns: int = 100, seed: int = 0) -> Dict[str, float]:
+    """
+    Play a game where both camps pick their joint action with joint.best_joint_move,
+    every search being one decision of runtime.
+
+    :return: runtime.report() at the end of the game
+    """
+    from joint import apply_joint, best_joint_move
+
+    rnd = random.Random(seed)
+    config = GameConfig(length=16, width=16, max_round=turns)
+    ctx = Context(config=config)
+    ctx.game_map = Map([Item(x=rnd.randrange(16), y=rnd.randrange(16), type=rnd.choice([0, 0, 0, 2]),
+                             time=rnd.randrange(1, turns + 1), param=rnd.randrange(1, 10), id=i)
+                        for i in range(turns // 2)], config=config)
+    controller = Controller(ctx)
+
+    def key(camp):
+        def score(state: Context) -> float:
+            walls = sum(row.count(camp) for row in state.game_map.wall_map)
+            return walls * 2 + sum(s.get_len() for s in state.snake_list if s.camp == camp)
+        return score
+
+    runtime.start()
+    try:
+        while ctx.turn <= turns and ctx.snake_list:
+            if controller.player == 0:
+                controller.round_preprocess()
+            controller.round_init()
+            if controller.next_snake != -1:
+                moves = sum(s.camp == controller.player for s in ctx.snake_list)
+                with runtime.decision(moves):
+                    action = best_joint_move(controller, key(controller.player), pool=runtime.pool)
+                apply_joint(controller, action)
+                runtime.idle()
+            controller.next_player()
+    finally:
+        runtime.stop()
+    return runtime.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decision latency of a joint move search with and without Runtime.')
+    parser.add_argument('--turns', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for name, runtime in (('plain', Runtime(control=False)), ('runtime', Runtime(pool=NodePool()))):
+        res = bench(runtime, args.turns, args.seed)
+        print('%-8s %5d decisions  p50 %8.2f ms  p99 %8.2f ms  max %8.2f ms  gc %8.2f ms'
+              % (name, res['decisions'], res['p50'] * 1e3, res['p99'] * 1e3, res['max'] * 1e3,
+                 res['gc_pause'] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import random
+
+import analytics
+from adk import Context, Controller, GameConfig, Item, Map
+from analytics import Deaths, LengthCurve, OpMix, PhaseTime, TurnEvent, analyze, record_game
+from joint import candidate_ops
+
+
+def random_game(seed: int, max_round: int = 40) -> dict:
+    rnd = random.Random(seed)
+    config = GameConfig(length=16, width=16, max_round=max_round)
+    ctx = Context(config=config)
+    items = [Item(x=rnd.randrange(16), y=rnd.randrange(16), type=rnd.choice([0, 2]), time=rnd.randrange(1, max_round),
+                  param=rnd.randrange(1, 8), id=i) for i in range(20)]
+    ctx.game_map = Map(items.copy(), config=config)
+    controller = Controller(ctx)
+    while ctx.turn <= max_round and ctx.snake_list:
+        if controller.player == 0:
+            controller.round_preprocess()
+        controller.round_init()
+        while controller.next_snake != -1:
+            controller.apply(rnd.choice(candidate_ops(controller)))
+        controller.next_player()
+    return record_game(ctx, items)
+
+
+def counting_replay(monkeypatch):
+    turns = []
+    replay = analytics.replay
+
+    def wrapped(game):
+        for event in replay(game):
+            if isinstance(event, TurnEvent):
+                turns.append(event.turn)
+            yield event
+
+    monkeypatch.setattr(analytics, 'replay', wrapped)
+    return turns
+
+
+def test_replay_stops_at_max_turn(monkeypatch):
+    turns = counting_replay(monkeypatch)
+    game = random_game(0)
+    phase, deaths = analyze([game], [PhaseTime(max_turn=5), Deaths(max_turn=5)])
+    assert phase.calls['preprocess'] == 5
+    assert deaths.turns == 5
+    # the replay is abandoned as soon as turn 6 begins
+    assert turns == [1, 2, 3, 4, 5, 6]
+
+
+def test_length_curve_is_done_at_max_turn(monkeypatch):
+    turns = counting_replay(monkeypatch)
+    curve, = analyze([random_game(1)], [LengthCurve(max_turn=3)])
+    assert turns == [1, 2, 3]
+    assert len(curve.result()['length_curve'][0]) == 3
+
+
+def test_log_only_metrics_do_not_replay(monkeypatch):
+    turns = counting_replay(monkeypatch)
+    game = random_game(2)
+    mix, = analyze([game], [OpMix()])
+    assert turns == []
+    assert sum(mix.count) == sum(len(ops) for ops in game['operations'])
+
+
+def test_horizon_does_not_change_full_results():
+    games = [random_game(seed) for seed in range(3)]
+    full = analyze(games, [Deaths()])[0].result()
+    long = analyze(games, [Deaths(max_turn=1000)])[0].result()
+    assert full == long
+
+
+def test_length_curve_covers_long_games():
+    long, short = random_game(0, max_round=600), random_game(1)
+    curve, = analyze([long], [LengthCurve()])
+    assert len(curve.result()['length_curve'][0]) == 600
+    # partial curves of different lengths merge as if they had been one run
+    part, = analyze([short], [LengthCurve()])
+    part.merge(curve)
+    both, = analyze([short, long], [LengthCurve()])
+    assert part.result() == both.result()
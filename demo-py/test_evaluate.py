@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+
+from adk import Context, GameConfig, Graph, Snake
+from evaluate import NEUTRAL, enclosed_mask, evaluate
+
+dx = [1, 0, -1, 0]
+dy = [0, 1, 0, -1]
+
+
+def random_loop(rnd: random.Random, length: int, width: int):
+    """
+    Walk randomly until the head runs into the body, like Controller.move does.
+
+    :return: the cycle that is cut off, in the order Controller.calc receives it
+    """
+    path = [(rnd.randrange(length), rnd.randrange(width))]
+    while True:
+        x, y = path[-1]
+        nxt = [(x + a, y + b) for a, b in zip(dx, dy)
+               if 0 <= x + a < length and 0 <= y + b < width and (len(path) < 2 or (x + a, y + b) != path[-2])]
+        step = rnd.choice(nxt)
+        if step in path:
+            return path[path.index(step):]
+        path.append(step)
+
+
+def test_enclosed_mask_matches_graph_calc():
+    enclosing = 0
+    for seed in range(500):
+        rnd = random.Random(seed)
+        length, width = rnd.choice([(16, 16), (5, 7), (9, 4)])
+        bound = random_loop(rnd, length, width)
+        expected = set(Graph(bound, length, width).calc())
+        boundary = np.zeros((length, width), dtype=bool)
+        xs, ys = zip(*bound)
+        boundary[list(xs), list(ys)] = True
+        got = {(int(x), int(y)) for x, y in zip(*np.nonzero(enclosed_mask(boundary)))}
+        assert got == expected, bound
+        enclosing += bool(expected)
+    assert enclosing > 10
+
+
+def test_evaluate_small_board():
+    # 5x5, snake 0 at (0, 4), snake 1 at (4, 0) and (3, 0). Camp 1 walls off the corner (0, 0),
+    # camp 0 has a wall in the middle. Cells with x < y are closer to snake 0, x > y to snake 1.
+    ctx = Context(config=GameConfig(length=5, width=5, max_round=10))
+    ctx.snake_list[1] = Snake([(4, 0), (3, 0)], [], 1, 1)
+    game_map = ctx.game_map
+    game_map.snake_map[3][0] = 1
+    game_map.set_wall([(1, 0), (0, 1)], 1, 1)
+    game_map.set_wall([(2, 2)], 0, 1)
+
+    res = evaluate(ctx)
+    assert res.walls == [1, 2]
+    assert res.territory == [8, 7]
+    assert res.mobility == {0: 18, 1: 18}
+    assert res.enclosure == {0: 0, 1: 0}
+    assert res.owner[0][0] == NEUTRAL and res.owner[1][1] == NEUTRAL
+    assert res.owner[1][3] == 0 and res.owner[2][0] == 1
+    assert res.score(0) == -res.score(1) == -1.0 + 0.5
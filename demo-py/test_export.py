@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+import pytest
+
+from export import export, open_shards, positions
+from test_analytics import random_game
+
+
+def resized(game: dict, length: int, width: int) -> dict:
+    ret = dict(game)
+    ret['length'], ret['width'] = length, width
+    ret['items'] = [[x % length, y % width, type, t, param] for x, y, type, t, param in game['items']]
+    return ret
+
+
+def test_export_round_trip(tmp_path):
+    games = [random_game(seed) for seed in range(2)]
+    rows = list(positions(games))
+    assert export(games, str(tmp_path), shard_size=100, chunk_size=32) == len(rows)
+
+    shards = open_shards(str(tmp_path))
+    planes, scalars, ops, results, margins = (np.concatenate(arrays) for arrays in zip(*shards))
+    assert len(ops) == len(rows)
+    for idx, (p, s, op, result, margin) in enumerate(rows):
+        assert (planes[idx] == p).all() and (scalars[idx] == s).all()
+        assert (ops[idx], results[idx], margins[idx]) == (op, result, margin)
+    assert (results == np.sign(margins)).all()
+
+
+def test_export_takes_board_size_from_first_game(tmp_path):
+    rnd = random.Random(0)
+    game = {'length': 12, 'width': 10, 'max_round': 20,
+            'items': [[rnd.randrange(12), rnd.randrange(10), 0, rnd.randrange(1, 20), 3] for _ in range(10)],
+            'operations': [[[1, 0, 3], [2, 0, 3]], [[1, 1, 2], [2, 1, 2]]]}
+    assert export([game], str(tmp_path)) > 0
+    assert open_shards(str(tmp_path))[0][0].shape[1:] == (9, 12, 10)
+
+
+def test_export_rejects_mixed_board_sizes(tmp_path):
+    game = random_game(0)
+    with pytest.raises(ValueError, match='12x16'):
+        export([game, resized(game, 12, 16)], str(tmp_path))
+
+
+def test_rejected_op_has_no_row_and_loses():
+    # snake 0 grows automatically and turns back onto its own body on turn 3
+    game = {'length': 16, 'width': 16, 'max_round': 10, 'items': [],
+            'operations': [[[1, 0, 1], [2, 0, 1], [3, 0, 3]], [[1, 1, 3], [2, 1, 3]]]}
+    rows = [(op, result, margin) for _, _, op, result, margin in positions([game])]
+    assert rows == [(1, -1, 0), (3, 1, 0), (1, -1, 0), (3, 1, 0)]
@@ -0,0 +1,76 @@
+import random
+import shutil
+
+import pytest
+
+from fuzz import Case, build_driver, compare, generate, run_cpp, run_py, shrink
+
+pytestmark = pytest.mark.skipif(shutil.which('g++') is None, reason='needs g++ to build the C++ driver')
+
+
+@pytest.fixture(scope='module')
+def driver():
+    return build_driver()
+
+
+def straight_line(turns: int) -> Case:
+    # snake 0 runs along y = 15 towards +x, snake 1 along y = 0 towards -x
+    return Case(ops=[1, 3] * turns)
+
+
+def test_engines_report_every_op(driver):
+    case = generate(random.Random(0))
+    py, cpp = run_py(case), run_cpp(case, driver)
+    assert len(py) == len(case.ops)
+    assert len(cpp) == len(case.ops)
+    assert all(line.count('|') == 4 for line in py + cpp)
+
+
+def test_engines_agree_on_plain_moves(driver):
+    case = straight_line(10)
+    assert compare(run_py(case), run_cpp(case, driver)) is None
+
+
+def test_rejected_op_is_not_a_divergence(driver):
+    # turning back is illegal: the C++ engine has already dropped the tail when it rejects
+    # the op, the Python engine has not, but the game is over either way
+    case = straight_line(10)
+    case.ops.append(3)
+    py, cpp = run_py(case), run_cpp(case, driver)
+    assert py[-1].startswith('0 ') and cpp[-1].startswith('0 ')
+    assert py[-1] != cpp[-1]
+    assert compare(py, cpp) is None
+
+
+def test_rejected_op_against_accepted_op_is_a_divergence():
+    accepted, rejected = '1 2 0|a|b|c|d', '0 2 0|a|b|c|d'
+    assert compare([accepted, rejected], [accepted, accepted]) == (1, ('status',))
+
+
+def test_game_over_is_not_a_rejection(driver):
+    case = Case(max_round=3, ops=[1, 3] * 3)
+    py, cpp = run_py(case), run_cpp(case, driver)
+    assert py[-1].startswith('2 4 -1|') and cpp[-1].startswith('2 4 -1|')
+    assert compare(py, cpp) is None
+    # unlike a rejected op, the state the last op leaves behind is still compared
+    over = '2 4 -1|a|b|c|d'
+    assert compare([over], [over.replace('b', 'x')]) == (0, ('snake_map',))
+
+
+def test_items_get_distinct_cells():
+    for seed in range(5):
+        items = generate(random.Random(seed)).items
+        assert len({(x, y) for x, y, _, _, _ in items}) == len(items)
+
+
+def test_shrink_keeps_the_signature(driver):
+    for seed in range(40):
+        case = generate(random.Random(seed))
+        res = compare(run_py(case), run_cpp(case, driver))
+        if res is not None and res[1] != ('status',):
+            break
+    else:
+        pytest.skip('no diverging case to shrink')
+    small = shrink(case, driver)
+    assert len(small.ops) <= len(case.ops) and len(small.items) <= len(case.items)
+    assert compare(run_py(small), run_cpp(small, driver))[1] == res[1]
@@ -0,0 +1,114 @@
+import copy
+import functools
+import random
+
+from adk import Context, Controller, GameConfig, Item, Map, Snake
+from joint import candidate_ops, is_legal, is_suicide, joint_moves
+from runtime import NodePool
+
+
+def state(controller: Controller) -> tuple:
+    ctx = controller.ctx
+    game_map = ctx.game_map
+    snakes = tuple((s.id, s.camp, tuple(s.coor_list), s.length_bank, tuple(i.id for i in s.item_list))
+                   for s in ctx.snake_list)
+    return (tuple(map(tuple, game_map.wall_map)), tuple(map(tuple, game_map.snake_map)),
+            tuple(map(tuple, game_map.item_map)), snakes, controller.next_snake, controller.snake_num)
+
+
+def positions(seed: int, max_round: int = 40):
+    """:return: deep copies of the controller at every decision of a random game"""
+    rnd = random.Random(seed)
+    config = GameConfig(length=16, width=16, max_round=max_round)
+    ctx = Context(config=config)
+    ctx.game_map = Map([Item(x=rnd.randrange(16), y=rnd.randrange(16), type=rnd.choice([0, 2, 2]),
+                             time=rnd.randrange(1, max_round), param=rnd.randrange(1, 8), id=i) for i in range(30)],
+                       config=config)
+    controller = Controller(ctx)
+    while ctx.turn <= max_round and ctx.snake_list:
+        if controller.player == 0:
+            controller.round_preprocess()
+        controller.round_init()
+        while controller.next_snake != -1:
+            yield copy.deepcopy(controller)
+            ops = candidate_ops(controller)
+            # favour splits and fire so that positions with several snakes and railguns show up
+            controller.apply(max(ops) if rnd.random() < 0.3 else rnd.choice(ops))
+        controller.next_player()
+
+
+def outcome(controller: Controller, op: int):
+    """:return: (accepted, killed without claiming anything) by applying op to a copy"""
+    after = copy.deepcopy(controller)
+    snake = after.current_snake_list[after.next_snake][0]
+    walls = copy.deepcopy(after.map.wall_map)
+    ok = after.apply(op)
+    dead = snake.id not in {s.id for s in after.ctx.snake_list}
+    return ok, dead and after.map.wall_map == walls, after
+
+
+def brute_force(controller: Controller, prefix=()):
+    if controller.next_snake == -1:
+        yield prefix, state(controller)
+        return
+    results = {op: outcome(controller, op) for op in range(1, 7)}
+    legal = [op for op, (ok, _, _) in results.items() if ok]
+    safe = [op for op in legal if not results[op][1]]
+    for op in safe or legal:
+        yield from brute_force(results[op][2], prefix + (op,))
+
+
+@functools.lru_cache()
+def all_positions():
+    return [controller for seed in range(4) for controller in positions(seed)]
+
+
+def test_is_legal_and_is_suicide_match_apply():
+    # a random sample, plus every position where the snake holds a railgun since they are rare
+    sample = random.Random(0).sample(all_positions(), 50)
+    sample += [c for c in all_positions() if c.current_snake_list[c.next_snake][0].item_list]
+    for controller in sample:
+        snake = controller.current_snake_list[controller.next_snake][0]
+        for op in range(1, 7):
+            ok, suicide, _ = outcome(controller, op)
+            assert is_legal(controller, snake, op) == ok, (snake, op)
+            if ok:
+                assert is_suicide(controller, snake, op) == suicide, (snake, op)
+
+
+def test_turn_back_of_a_two_cell_snake():
+    # a two cell snake may turn back onto its tail unless it is going to grow
+    for bank, turn in ((0, 20), (1, 20), (0, 5)):
+        ctx = Context(config=GameConfig(length=16, width=16, max_round=40))
+        ctx.turn = turn
+        snake = Snake([(5, 5), (5, 6)], [], 0, 0)
+        snake.length_bank = bank
+        ctx.snake_list[0] = snake
+        ctx.game_map.snake_map[0][15] = -1
+        ctx.game_map.add_map_snake(snake.coor_list, 0)
+        controller = Controller(ctx)
+        controller.round_init()
+        ok, suicide, _ = outcome(controller, 2)
+        assert is_legal(controller, snake, 2) == ok == (bank == 0 and turn > ctx.auto_growth_round)
+        assert not suicide
+
+
+def test_joint_moves_match_brute_force():
+    pool = NodePool()
+    # decisions of the first snake of a camp, i.e. the start of its turn
+    turns = [c for c in all_positions() if all(t != c.ctx.turn for t, _, _ in c.ctx.player_operations[c.player])]
+    for controller in random.Random(0).sample(turns, 12):
+        expected = dict(brute_force(controller))
+        before = state(controller)
+        assert {action: state(s) for action, s in joint_moves(controller)} == expected
+        assert {action: state(s) for action, s in joint_moves(controller, pool=pool)} == expected
+        assert state(controller) == before
+
+
+def test_restricted_ops_fall_back_to_all_ops():
+    controller = Controller(Context(config=GameConfig(length=16, width=16, max_round=10)))
+    controller.round_preprocess()
+    controller.round_init()
+    # the snakes have length 1 on turn 1, they can neither fire nor split
+    actions = [action for action, _ in joint_moves(controller, ops=(5, 6))]
+    assert actions == [action for action, _ in joint_moves(controller)] == [(1,), (4,)]
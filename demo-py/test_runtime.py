@@ -0,0 +1,105 @@
+import gc
+
+import pytest
+
+from adk import Context, Controller, GameConfig
+from joint import joint_moves
+from runtime import NodePool, Runtime, bench
+
+
+@pytest.fixture
+def gc_state():
+    saved = gc.get_threshold(), gc.isenabled()
+    yield
+    gc.set_threshold(*saved[0])
+    gc.enable() if saved[1] else gc.disable()
+
+
+def controller() -> Controller:
+    ctx = Context(config=GameConfig(length=16, width=16, max_round=64))
+    ret = Controller(ctx)
+    ret.round_preprocess()
+    ret.round_init()
+    return ret
+
+
+def test_stop_restores_gc_settings(gc_state):
+    gc.set_threshold(123, 4, 5)
+    gc.disable()
+    rt = Runtime()
+    rt.start()
+    with rt.decision():
+        assert not gc.isenabled()
+    # decision restores the state it found, start does not enable the GC by itself
+    assert not gc.isenabled()
+    rt.stop()
+    assert gc.get_threshold() == (123, 4, 5)
+    assert not gc.isenabled()
+
+
+def test_stop_unfreezes_what_start_froze(gc_state):
+    gc.unfreeze()
+    rt = Runtime()
+    rt.start()
+    assert gc.get_freeze_count() > 0
+    rt.stop()
+    assert gc.get_freeze_count() == 0
+
+
+def test_stop_keeps_objects_frozen_by_the_caller(gc_state):
+    gc.freeze()
+    frozen = gc.get_freeze_count()
+    try:
+        rt = Runtime()
+        rt.start()
+        rt.stop()
+        assert gc.get_freeze_count() == frozen
+    finally:
+        gc.unfreeze()
+
+
+def test_decision_restores_enabled_gc(gc_state):
+    gc.enable()
+    rt = Runtime()
+    with rt.decision():
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+
+def test_pool_allocations_are_counted_per_decision(gc_state):
+    pool = NodePool()
+    rt = Runtime(pool=pool)
+    ctrl = controller()
+    for _ in range(2):
+        with rt.decision():
+            actions = [action for action, _ in joint_moves(ctrl, pool=pool)]
+    first, second = rt.history
+    assert len(actions) > 1
+    assert first.pool_requests == second.pool_requests > 0
+    # the second search runs entirely on objects released by the first
+    assert first.pool_allocations > 0
+    assert second.pool_allocations == 0
+    assert rt.report()['pool_allocations_per_move'] == first.pool_allocations / 2
+
+
+def test_trace_records_peak_memory(gc_state):
+    rt = Runtime(trace=True)
+    rt.start()
+    try:
+        with rt.decision():
+            junk = [(i, i) for i in range(100000)]
+            del junk
+    finally:
+        rt.stop()
+    assert rt.history[0].peak_bytes > 100000 * 56
+    # almost everything was freed again, the retained figure does not count it
+    assert rt.history[0].retained_blocks < 100000 // 10
+
+
+def test_bench_without_control_leaves_gc_alone(gc_state):
+    gc.enable()
+    threshold = gc.get_threshold()
+    res = bench(Runtime(control=False), turns=20)
+    assert res['decisions'] > 0 and res['p99'] >= res['p50']
+    assert gc.isenabled() and gc.get_threshold() == threshold
+    assert bench(Runtime(pool=NodePool()), turns=20)['decisions'] == res['decisions']